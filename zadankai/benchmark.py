@@ -0,0 +1,83 @@
+#!/usr/local/bin/python3
+
+# Model build time, build memory and search throughput of both model variants on a
+# seeded random instance, so changes to the model layer can be compared run to run.
+
+import argparse
+import random
+import resource
+import time
+from zadankai import zk, zk_alt
+
+
+def make_instance(num_companies, num_students, num_terms, seed):
+    rng = random.Random(seed)
+    return {
+        'companies': {
+            'count': num_companies,
+            'groups': [rng.randint(1, 5) for _ in range(num_companies)],
+            'ratings': {
+                'values': [[rng.randint(0, 4) for _ in range(num_students)] for _ in range(num_companies)],
+                'weight': 1,
+            },
+        },
+        'students': {
+            'count': num_students,
+            'ratings': {
+                'values': [[rng.randint(0, 4) for _ in range(num_companies)] for _ in range(num_students)],
+                'weight': 1,
+            },
+        },
+        'terms': {'count': num_terms},
+        'weights': {
+            'delta': {'ttl': 20, 'var': 80, 'obj': 60},
+            'satisfaction': {'ttl': 20, 'var': 80, 'obj': 40},
+        },
+    }
+
+
+def _rss():
+    # Current resident set size in bytes (Linux), which unlike tracemalloc includes the solver's own memory
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def measure(module, instance, search_timeout, repeat):
+    # Best of repeat builds, which is the least disturbed by whatever else runs on the machine
+    build_time = None
+    for _ in range(repeat):
+        zk_csp = None
+        rss = _rss()
+        start = time.perf_counter()
+        zk_csp = module.ZadankaiCSP(instance['companies'], instance['students'], instance['terms'])
+        elapsed = time.perf_counter() - start
+        if build_time is None:
+            # Later builds reuse the pages freed by the previous one
+            build_memory = _rss() - rss
+        build_time = elapsed if build_time is None else min(build_time, elapsed)
+
+    # The solver's random seed is fixed, so the default strategy explores the same tree every run
+    zk_csp.solve(instance['weights'], max_timeout=search_timeout)
+    return {
+        'build_s': round(build_time, 3),
+        'build_mib': round(build_memory / 2**20, 1),
+        'branches_per_s': int(zk_csp.csp.Branches() / max(zk_csp.csp.WallTime() / 1000, 1e-3)),
+        'objectives': zk_csp.objectives(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark zk and zk_alt model construction and search")
+    parser.add_argument('--companies', type=int, default=30)
+    parser.add_argument('--students', type=int, default=200)
+    parser.add_argument('--terms', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--search-timeout', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3, help="model builds per variant, the fastest is reported")
+    args = parser.parse_args()
+
+    instance = make_instance(args.companies, args.students, args.terms, args.seed)
+    for module in (zk, zk_alt):
+        print(module.__name__, measure(module, instance, args.search_timeout, args.repeat))
+    # ru_maxrss is in KiB on Linux
+    print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
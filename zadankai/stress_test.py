@@ -1,6 +1,7 @@
 #!/usr/local/bin/python3
 
 import random
+import resource
 from zadankai.zk_wrap import run
 
 num_companies = 30
@@ -59,3 +60,6 @@ json = {
 }
 
 print(run(json))
+
+# ru_maxrss is in KiB on Linux
+print(f"Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
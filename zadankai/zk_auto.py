@@ -0,0 +1,90 @@
+#!/usr/local/bin/python3
+
+from zadankai.zk_ratings import CombinedRatings
+
+# Policy table for zk_wrap's auto mode. Rules are tried in order and the first
+# one whose 'when' conditions all hold decides the configuration:
+#   max_size / min_size             groups x terms x students of the zk_alt model
+#   max_avg_group_size              students per group and term
+#   min_density / max_density       share of (company, student) pairs with a combined rating above 0
+# and 'use' gives the configuration:
+#   engine          'cp' (one zk_alt model) or 'decomposition' (zk_decompose)
+#   objective       'weighted' (solve) or 'staged' (solve_staged)
+#   stage_split     share of the search time spent removing duplicates before improving satisfaction
+#   construction_share  share of maxTimeout for the greedy construction and repair (zk_decompose.complete)
+#                   the CP search starts from; the search improves on it for the rest. If the search
+#                   still finds nothing, the construction is returned.
+#   next_var        pywrapcp.Solver variable selection strategy name
+#   next_value      pywrapcp.Solver value selection strategy name
+#   cluster_cells   target model size of one decomposition cluster
+AUTO_POLICY = [
+    # Tiny events such as example.py: the weighted search converges within seconds
+    {
+        'when': {'max_size': 1_000},
+        'use': {'engine': 'cp', 'objective': 'weighted', 'construction_share': 0.1, 'next_var': 'CHOOSE_RANDOM', 'next_value': 'ASSIGN_MAX_VALUE'},
+    },
+    # Small events with sparse ratings: most pairs tie, so duplicates matter most
+    {
+        'when': {'max_size': 2_500, 'max_density': 0.5},
+        'use': {'engine': 'cp', 'objective': 'staged', 'stage_split': 0.7, 'construction_share': 0.1, 'next_var': 'CHOOSE_RANDOM', 'next_value': 'ASSIGN_MAX_VALUE'},
+    },
+    {
+        'when': {'max_size': 2_500},
+        'use': {'engine': 'cp', 'objective': 'staged', 'stage_split': 0.4, 'construction_share': 0.1, 'next_var': 'CHOOSE_RANDOM', 'next_value': 'ASSIGN_MAX_VALUE'},
+    },
+    # Anything larger (real_values_test.py, stress_test.py) is split by student clusters
+    {
+        'when': {},
+        'use': {'engine': 'decomposition', 'cluster_cells': 1_500},
+    },
+]
+
+# Clusters are also never smaller than the group count (see zk_decompose.solve)
+MAX_CLUSTER_SIZE = 100
+
+
+def features(json_input):
+    num_companies = json_input['companies']['count']
+    num_students = json_input['students']['count']
+    num_terms = json_input['terms']['count']
+    num_groups = sum(json_input['companies']['groups'])
+    ratings = CombinedRatings(
+        json_input['companies']['ratings'], json_input['students']['ratings'], num_companies, num_students
+    )
+    rated = sum(1 for _, _, rating in ratings.expressed() if rating > 0)
+    if ratings.default is not None and ratings.default > 0:
+        rated += num_companies * num_students - len(ratings.ratings)
+    return {
+        'size': num_groups * num_terms * num_students,
+        'avg_group_size': num_students / num_groups,
+        'density': rated / (num_companies * num_students),
+    }
+
+
+def _matches(when, instance):
+    return (
+        instance['size'] <= when.get('max_size', instance['size'])
+        and instance['size'] >= when.get('min_size', instance['size'])
+        and instance['avg_group_size'] <= when.get('max_avg_group_size', instance['avg_group_size'])
+        and instance['density'] >= when.get('min_density', instance['density'])
+        and instance['density'] <= when.get('max_density', instance['density'])
+    )
+
+
+def select_configuration(json_input, policy=AUTO_POLICY):
+    instance = features(json_input)
+    for rule in policy:
+        if _matches(rule['when'], instance):
+            configuration = dict(rule['use'])
+            break
+    else:
+        raise ValueError("No auto policy rule matches the instance")
+
+    if configuration['engine'] == 'decomposition':
+        cells_per_student = instance['size'] // json_input['students']['count']
+        cluster_size = configuration['cluster_cells'] // cells_per_student
+        num_groups = sum(json_input['companies']['groups'])
+        configuration['cluster_size'] = max(min(cluster_size, MAX_CLUSTER_SIZE), num_groups)
+
+    configuration['features'] = instance
+    return configuration
@@ -0,0 +1,81 @@
+#!/usr/local/bin/python3
+
+import argparse
+import contextlib
+import heapq
+import json
+import multiprocessing
+import os
+import sys
+from zadankai.zk_wrap import run
+
+
+def instance_size(event):
+    try:
+        return sum(event['companies']['groups']) * event['terms']['count'] * event['students']['count']
+    except (KeyError, TypeError):
+        # Malformed events are cheap: they fail as soon as they run
+        return 0
+
+
+def read_events(stream):
+    return [json.loads(line) for line in stream if line.strip()]
+
+
+# Splits the total budget across events in proportion to their size, no event getting more
+# than the whole budget, then scales every share down until the schedule run_batch follows
+# (smallest first, each event to the first free worker) ends within the budget.
+# Timeouts are whole seconds of at least 1, so tiny budgets over many events can still overrun.
+# Returns copies of the events with their maxTimeout set; events that are not objects are left
+# as they are, to fail when they run.
+def _assign_timeouts(events, total_timeout, processes):
+    sizes = [instance_size(event) for event in events]
+    total_size = sum(sizes) or 1
+    shares = [min(total_timeout, total_timeout * processes * size / total_size) for size in sizes]
+
+    finish_times = [0] * processes
+    for i in sorted(range(len(events)), key=lambda i: sizes[i]):
+        heapq.heapreplace(finish_times, finish_times[0] + shares[i])
+    makespan = max(finish_times)
+    scale = min(1, total_timeout / makespan) if makespan else 1
+
+    return [
+        {**event, 'maxTimeout': max(1, int(share * scale))} if isinstance(event, dict) else event
+        for event, share in zip(events, shares)
+    ]
+
+
+def _run_event(indexed_event):
+    index, event = indexed_event
+    if not isinstance(event, dict):
+        return {'id': index, 'error': f"TypeError: event must be a JSON object, not {type(event).__name__}"}
+    event_id = event.get('id', index)
+    try:
+        # zk_wrap prints the solution; keep that out of the result stream
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = json.loads(run(event))
+        return {'id': event_id, 'result': result}
+    except Exception as e:
+        return {'id': event_id, 'error': f"{type(e).__name__}: {e}"}
+
+
+def run_batch(events, output, total_timeout=None, processes=None):
+    events = list(events)
+    processes = processes or os.cpu_count() or 1
+    if total_timeout is not None:
+        events = _assign_timeouts(events, total_timeout, processes)
+
+    # Smallest first, one at a time, so small events never wait behind a huge one
+    indexed_events = sorted(enumerate(events), key=lambda indexed: instance_size(indexed[1]))
+    with multiprocessing.Pool(processes) as pool:
+        for outcome in pool.imap_unordered(_run_event, indexed_events, chunksize=1):
+            output.write(json.dumps(outcome) + '\n')
+            output.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Solve NDJSON zadankai events from stdin, one result line per event on stdout")
+    parser.add_argument('--budget', type=float, help="total time budget in seconds, split by instance size")
+    parser.add_argument('--processes', type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    run_batch(read_events(sys.stdin), sys.stdout, total_timeout=args.budget, processes=args.processes)
@@ -0,0 +1,109 @@
+#!/usr/local/bin/python3
+
+# Analytic feasibility pre-checks, run from counts and groups alone before any model is
+# built: check for zk, check_alt for zk_alt. Each returns a list of reasons; an empty list
+# means no infeasibility could be proven (the model may still turn out infeasible).
+
+# Most Students a zk Company takes per Term
+ZK_MAX_HEADCOUNT = 10
+
+
+class InfeasibleError(ValueError):
+    def __init__(self, reasons):
+        super().__init__("; ".join(reason['message'] for reason in reasons))
+        self.reasons = reasons
+
+
+def _reason(code, message, **details):
+    return {'reason': code, 'message': message, **details}
+
+
+def _check_structure(companies, students, terms):
+    reasons = []
+    num_companies = companies['count']
+    num_students = students['count']
+    num_terms = terms['count']
+    groups = companies['groups']
+
+    if num_companies <= 0 or num_students <= 0 or num_terms <= 0:
+        reasons.append(_reason(
+            'empty_instance',
+            "Companies, students and terms must all be at least 1",
+            num_companies=num_companies, num_students=num_students, num_terms=num_terms,
+        ))
+    if len(groups) != num_companies:
+        reasons.append(_reason(
+            'groups_mismatch',
+            f"{len(groups)} group counts given for {num_companies} companies",
+            num_companies=num_companies, num_group_counts=len(groups),
+        ))
+    if any(g <= 0 for g in groups):
+        reasons.append(_reason(
+            'empty_company',
+            "Every company must have at least one group",
+            companies=[c for c, g in enumerate(groups) if g <= 0],
+        ))
+    return reasons
+
+
+def zk_min_headcounts(num_students, groups):
+    # Each zk Company's headcount floor: its Group count, capped by the smallest proportional target
+    avg_group_size = num_students / sum(groups)
+    target_assignments = [round(num_groups * avg_group_size) for num_groups in groups]
+    return [min(min(target_assignments), num_groups) for num_groups in groups]
+
+
+def check(companies, students, terms):
+    reasons = _check_structure(companies, students, terms)
+    if reasons:
+        return reasons
+
+    num_companies = companies['count']
+    num_students = students['count']
+    num_terms = terms['count']
+
+    # Each Student visits a different Company every Term
+    if num_terms > num_companies:
+        reasons.append(_reason(
+            'too_many_terms',
+            f"{num_terms} terms but only {num_companies} companies to visit once each",
+            num_terms=num_terms, num_companies=num_companies,
+        ))
+
+    # Every Student is seated each Term, at most ZK_MAX_HEADCOUNT per Company
+    if num_companies * ZK_MAX_HEADCOUNT < num_students:
+        reasons.append(_reason(
+            'headcount_cap_too_low',
+            f"{num_students} students cannot fit in {num_companies} companies of at most {ZK_MAX_HEADCOUNT}",
+            num_students=num_students, capacity=num_companies * ZK_MAX_HEADCOUNT,
+        ))
+
+    # Headcount floors of all Companies must be met by the Students of one Term
+    min_headcounts = zk_min_headcounts(num_students, companies['groups'])
+    if sum(min_headcounts) > num_students:
+        reasons.append(_reason(
+            'headcount_floor_too_high',
+            f"Headcount floors sum to {sum(min_headcounts)} but there are only {num_students} students",
+            num_students=num_students, floors=min_headcounts,
+        ))
+
+    return reasons
+
+
+def check_alt(companies, students, terms):
+    reasons = _check_structure(companies, students, terms)
+    if reasons:
+        return reasons
+
+    num_terms = terms['count']
+    num_groups = sum(companies['groups'])
+
+    # Each Student visits a different Group every Term
+    if num_terms > num_groups:
+        reasons.append(_reason(
+            'too_many_terms',
+            f"{num_terms} terms but only {num_groups} groups to visit once each",
+            num_terms=num_terms, num_groups=num_groups,
+        ))
+
+    return reasons
@@ -0,0 +1,330 @@
+#!/usr/local/bin/python3
+
+import multiprocessing
+import os
+import time
+from zadankai import zk_ratings
+from zadankai.zk_alt import ZadankaiCSP
+from zadankai.zk_output import columnar_hint
+
+DEFAULT_CLUSTER_SIZE = 40
+KMEANS_ITERATIONS = 10
+DUPLICATE_PENALTY = 1000
+# Share of maxTimeout kept for the repair pass after the cluster searches
+REPAIR_SHARE = 0.1
+
+# Seconds the last cluster solved in this process spent outside its search (building the
+# model, setting up the search); the next clusters of the same solve plan with it
+_cluster_overhead = 0.0
+
+
+# Rating profile of a student: its combined affinity with every company
+def _profiles(companies, students):
+    c_weight = companies['ratings']['weight']
+    s_weight = students['ratings']['weight']
+    c_rating = zk_ratings.lookup(companies['ratings'])
+    s_rating = zk_ratings.lookup(students['ratings'])
+    return [
+        [c_weight * c_rating(c, s) + s_weight * s_rating(s, c) for c in range(companies['count'])]
+        for s in range(students['count'])
+    ]
+
+
+def _distance(profile, centroid):
+    return sum((p - q) ** 2 for p, q in zip(profile, centroid))
+
+
+def _margin(distances):
+    nearest = sorted(distances)[:2]
+    return nearest[0] - nearest[-1]
+
+
+# Balanced k-means: clusters of similar profiles, none larger than capacity
+def _cluster(profiles, num_clusters):
+    num_students = len(profiles)
+    capacity = -(-num_students // num_clusters)
+    by_profile = sorted(range(num_students), key=lambda s: profiles[s])
+    centroids = [list(profiles[by_profile[k * num_students // num_clusters]]) for k in range(num_clusters)]
+
+    clusters = None
+    for _ in range(KMEANS_ITERATIONS):
+        distances = [[_distance(p, centroid) for centroid in centroids] for p in profiles]
+        # Students with the clearest preference for a centroid pick first
+        order = sorted(range(num_students), key=lambda s: _margin(distances[s]))
+        new_clusters = [[] for _ in range(num_clusters)]
+        for s in order:
+            for k in sorted(range(num_clusters), key=lambda k: distances[s][k]):
+                if len(new_clusters[k]) < capacity:
+                    new_clusters[k].append(s)
+                    break
+        new_clusters = [sorted(cluster) for cluster in new_clusters]
+        if new_clusters == clusters:
+            break
+        clusters = new_clusters
+        centroids = [
+            [sum(profiles[s][c] for s in cluster) / len(cluster) for c in range(len(profiles[0]))]
+            if cluster else centroid
+            for cluster, centroid in zip(clusters, centroids)
+        ]
+    return [cluster for cluster in clusters if cluster]
+
+
+def _sub_input(json_input, cluster):
+    companies = json_input['companies']
+    students = json_input['students']
+    return {
+        'companies': {
+            **companies,
+            'ratings': zk_ratings.subset(companies['ratings'], cols=cluster),
+        },
+        'students': {
+            **students,
+            'count': len(cluster),
+            'ratings': zk_ratings.subset(students['ratings'], rows=cluster),
+        },
+        'terms': json_input['terms'],
+        'weights': json_input['weights'],
+        'maxTimeout': json_input['maxTimeout'],
+    }
+
+
+def _slots(companies):
+    return [(c, gi) for c in range(companies['count']) for gi in range(companies['groups'][c])]
+
+
+# Greedy schedule for when the search finds nothing in time: term by term, each student
+# takes its best unvisited group with room left, avoiding companies it has already seen.
+# Headcounts below target are left to _repair.
+def _construct(sub_input, seed=None):
+    companies = sub_input['companies']
+    num_students = sub_input['students']['count']
+    num_terms = sub_input['terms']['count']
+    profiles = _profiles(companies, sub_input['students'])
+    slots = _slots(companies)
+    capacity = int(num_students / len(slots)) + 1
+
+    assignments = {
+        c: {gi: {t: [] for t in range(num_terms)} for gi in range(companies['groups'][c])}
+        for c in range(companies['count'])
+    }
+    visited = [set() for _ in range(num_students)]
+    # seed[t][s] fixes the group (numbered like slots) of some students up front
+    for t, column in enumerate(seed or []):
+        for s, g in enumerate(column):
+            if g is not None:
+                c, gi = slots[g]
+                assignments[c][gi][t].append(s)
+                visited[s].add((c, gi))
+    for t in range(num_terms):
+        # Rotate who picks first so no student always gets the leftovers
+        for i in range(num_students):
+            s = (i + t * num_students // num_terms) % num_students
+            if seed and seed[t][s] is not None:
+                continue
+            seen_companies = {c for c, _ in visited[s]}
+            candidates = [slot for slot in slots if slot not in visited[s]]
+            with_room = [slot for slot in candidates if len(assignments[slot[0]][slot[1]][t]) < capacity]
+            c, gi = min(
+                with_room or candidates,
+                key=lambda slot: (slot[0] in seen_companies, -profiles[s][slot[0]], len(assignments[slot[0]][slot[1]][t])),
+            )
+            assignments[c][gi][t].append(s)
+            visited[s].add((c, gi))
+    return assignments
+
+
+# The model build counts against the cluster's maxTimeout and only what is left is searched;
+# when the last cluster's overhead leaves nothing to search, the model is not built at all
+def _solve_cluster(sub_input):
+    global _cluster_overhead
+
+    started = time.monotonic()
+    # hintColumns: the cluster's part of the caller's hint, renumbered like the sub input
+    hint_columns = sub_input.get('hintColumns')
+    result = None
+    if _cluster_overhead < sub_input['maxTimeout']:
+        hint = columnar_hint(sub_input['companies']['groups'], hint_columns) if hint_columns else None
+        zk_csp = ZadankaiCSP(sub_input['companies'], sub_input['students'], sub_input['terms'])
+        search_timeout = sub_input['maxTimeout'] - max(_cluster_overhead, time.monotonic() - started)
+        if search_timeout > 0:
+            result = zk_csp.solve(sub_input['weights'], max_timeout=search_timeout, hint=hint)
+            _cluster_overhead = time.monotonic() - started - search_timeout
+        else:
+            _cluster_overhead = time.monotonic() - started
+    if result is None:
+        result = _construct(sub_input, hint_columns)
+    return result
+
+
+def _merge(json_input, clusters, sub_results):
+    groups = json_input['companies']['groups']
+    num_terms = json_input['terms']['count']
+    merged = {
+        c: {gi: {t: [] for t in range(num_terms)} for gi in range(groups[c])}
+        for c in range(json_input['companies']['count'])
+    }
+    for cluster, sub_result in zip(clusters, sub_results):
+        for c, company_groups in sub_result.items():
+            for gi, terms in company_groups.items():
+                for t, local_students in terms.items():
+                    merged[c][gi][t].extend(cluster[s] for s in local_students)
+    for company_groups in merged.values():
+        for terms in company_groups.values():
+            for students in terms.values():
+                students.sort()
+    return merged
+
+
+# Moves students between groups until every headcount is within [target, target + 1].
+# Students never cross clusters, so repeat visits can only appear through these moves.
+# Only the given terms are touched (default: all of them). Headcounts and the over/under
+# full slot sets are kept up to date as students move; past deadline (time.monotonic()),
+# the remaining terms are left as they are. Returns the terms still out of range.
+def _repair(json_input, assignments, terms=None, deadline=None):
+    companies = json_input['companies']
+    num_students = json_input['students']['count']
+    num_terms = json_input['terms']['count']
+    profiles = _profiles(companies, json_input['students'])
+    slots = _slots(companies)
+    target_headcount = int(num_students / len(slots))
+
+    # Per student: the slots it attends over all terms, and how many terms it spends at each company
+    visited = [set() for _ in range(num_students)]
+    company_visits = [[0] * companies['count'] for _ in range(num_students)]
+    for c, gi in slots:
+        for t in range(num_terms):
+            for s in assignments[c][gi][t]:
+                visited[s].add((c, gi))
+                company_visits[s][c] += 1
+
+    def move_cost(s, source, destination):
+        if destination in visited[s]:
+            return None
+        cost = profiles[s][source[0]] - profiles[s][destination[0]]
+        if company_visits[s][destination[0]] > (source[0] == destination[0]):
+            cost += DUPLICATE_PENALTY
+        return cost
+
+    def best_move(t, sources, destinations, frozen):
+        best = None
+        for source in sources:
+            for s in assignments[source[0]][source[1]][t]:
+                if s in frozen:
+                    continue
+                for destination in destinations:
+                    cost = move_cost(s, source, destination)
+                    if cost is not None and (best is None or cost < best[0]):
+                        best = (cost, s, source, destination)
+        return best
+
+    unrepaired = []
+    for t in terms if terms is not None else range(num_terms):
+        headcount = {slot: len(assignments[slot[0]][slot[1]][t]) for slot in slots}
+        over = {slot for slot in slots if headcount[slot] > target_headcount + 1}
+        under = {slot for slot in slots if headcount[slot] < target_headcount}
+        # Slots that can give a student away, or take one, without leaving the range
+        spare = {slot for slot in slots if headcount[slot] > target_headcount}
+        room = {slot for slot in slots if headcount[slot] < target_headcount + 1}
+
+        def update(slot):
+            for members, member in ((over, headcount[slot] > target_headcount + 1), (under, headcount[slot] < target_headcount),
+                                    (spare, headcount[slot] > target_headcount), (room, headcount[slot] < target_headcount + 1)):
+                if member:
+                    members.add(slot)
+                else:
+                    members.discard(slot)
+
+        # Students already pushed along an ejection chain stay put, so chains cannot cycle
+        frozen = set()
+        while over or under:
+            if deadline is not None and time.monotonic() >= deadline:
+                unrepaired.append(t)
+                break
+            best = best_move(t, over or spare, under or room, frozen)
+            if best is None:
+                # No direct move: shift a student into any group with room and retry from there
+                best = best_move(t, spare, room, frozen)
+                if best is None:
+                    unrepaired.append(t)
+                    break
+                frozen.add(best[1])
+            _, s, source, destination = best
+            assignments[source[0]][source[1]][t].remove(s)
+            assignments[destination[0]][destination[1]][t].append(s)
+            assignments[destination[0]][destination[1]][t].sort()
+            visited[s].discard(source)
+            visited[s].add(destination)
+            company_visits[s][source[0]] -= 1
+            company_visits[s][destination[0]] += 1
+            headcount[source] -= 1
+            headcount[destination] += 1
+            update(source)
+            update(destination)
+    return unrepaired
+
+
+# Turns the columns kept from a hint (zk_output.columns_from_hint), or all-None columns, into
+# a full assignment with headcounts in range (as far as the repair gets by deadline), for the
+# CP search to start from
+def complete(json_input, columns, deadline=None):
+    assignments = _construct(json_input, columns)
+    _repair(json_input, assignments, deadline=deadline)
+    for terms in assignments.values():
+        for students_by_term in terms.values():
+            for students in students_by_term.values():
+                students.sort()
+    return assignments
+
+
+# Greedy column for the term after columns, with those terms kept as they are; hint_column
+# fixes some students up front. Returns the column and whether its headcounts are in range.
+def construct_term(json_input, columns, hint_column=None):
+    partial = {**json_input, 'terms': {'count': len(columns) + 1}}
+    t = len(columns)
+    assignments = _construct(partial, columns + [hint_column or [None] * json_input['students']['count']])
+    repaired = not _repair(partial, assignments, terms=[t])
+    column = [None] * json_input['students']['count']
+    for g, (c, gi) in enumerate(_slots(json_input['companies'])):
+        for s in assignments[c][gi][t]:
+            column[s] = g
+    return column, repaired
+
+
+# Clustering, the cluster builds and searches, and the repair pass all come out of maxTimeout
+def solve(json_input, cluster_size=DEFAULT_CLUSTER_SIZE, processes=None, hint_columns=None):
+    global _cluster_overhead
+
+    deadline = time.monotonic() + json_input['maxTimeout']
+    # Overheads of an earlier solve (zk_worker, zk_batch) say nothing about this input
+    _cluster_overhead = 0.0
+    num_students = json_input['students']['count']
+    # Smaller clusters than the group count would have a target headcount of 0: group sizes
+    # would not be split in proportion at all, leaving all the balancing to _repair
+    max_clusters = max(1, num_students // sum(json_input['companies']['groups']))
+    num_clusters = min(max(1, round(num_students / cluster_size)), max_clusters)
+    clusters = _cluster(_profiles(json_input['companies'], json_input['students']), num_clusters)
+
+    # Pool workers (zk_batch, zk_worker) cannot have children: they solve the clusters themselves
+    in_process = multiprocessing.current_process().daemon
+    workers = 1 if in_process else processes or os.cpu_count() or 1
+    # Clusters run in waves of workers, each wave getting an equal share of what clustering
+    # left of maxTimeout, minus the repair pass's share
+    waves = -(-len(clusters) // workers)
+    cluster_timeout = max(0.0, (deadline - time.monotonic()) - json_input['maxTimeout'] * REPAIR_SHARE) / waves
+
+    sub_inputs = [{**_sub_input(json_input, cluster), 'maxTimeout': cluster_timeout} for cluster in clusters]
+    if hint_columns:
+        for sub_input, cluster in zip(sub_inputs, clusters):
+            sub_input['hintColumns'] = [[column[s] for s in cluster] for column in hint_columns]
+    if in_process:
+        sub_results = [_solve_cluster(sub_input) for sub_input in sub_inputs]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            sub_results = pool.map(_solve_cluster, sub_inputs, chunksize=1)
+
+    assignments = _merge(json_input, clusters, sub_results)
+    # Terms whose headcounts are still outside [target, target + 1]; callers must surface them
+    # The repair keeps its share even when the cluster phase ran over
+    repair_deadline = max(deadline, time.monotonic() + json_input['maxTimeout'] * REPAIR_SHARE)
+    unrepaired = _repair(json_input, assignments, deadline=repair_deadline)
+    return assignments, unrepaired
@@ -0,0 +1,64 @@
+#!/usr/local/bin/python3
+
+
+class ZadankaiIndex:
+    # Dimensions and flat array layout shared by the zk models. Groups are numbered contiguously
+    # across Companies; models where a Company is a single Group (zk) pass one Group per Company.
+    # Variables and expressions live in flat lists indexed by (group, term, student),
+    # (group, term), (group, student) or (company, student), in that nesting order.
+
+    def __init__(self, num_companies, num_students, num_terms, groups):
+        self.num_companies = num_companies
+        self.num_students = num_students
+        self.num_terms = num_terms
+        self.num_groups_per_company = groups
+        self.num_groups = sum(groups)
+
+        self.rg_companies = range(num_companies)
+        self.rg_students = range(num_students)
+        self.rg_terms = range(num_terms)
+        self.rg_groups = range(self.num_groups)
+
+        self.company_groups = []
+        first_group = 0
+        for num_groups in groups:
+            self.company_groups.append(range(first_group, first_group + num_groups))
+            first_group += num_groups
+        self.group_company = [c for c in self.rg_companies for _ in self.company_groups[c]]
+
+    def gts(self, group, term, student):
+        return (group * self.num_terms + term) * self.num_students + student
+
+    def gt(self, group, term):
+        return group * self.num_terms + term
+
+    def gs(self, group, student):
+        return group * self.num_students + student
+
+    def cs(self, company, student):
+        return company * self.num_students + student
+
+    def students(self, group, term):
+        # Slice of the (group, term) row of a (group, term, student) array
+        start = self.gts(group, term, 0)
+        return slice(start, start + self.num_students)
+
+    def company_dissatisfaction(self, combined_ratings):
+        # 100 - combined rating per (company, student). Dense even for sparse ratings: the model
+        # has a variable per (group, term, student) anyway, each needing its coefficient.
+        return [100 - combined_ratings[cs] for cs in range(self.num_companies * self.num_students)]
+
+    def dissatisfaction_coefficients(self, company_dissatisfaction):
+        # Per (group, term, student): every Group repeats its Company's row once per Term
+        coefficients = []
+        for g in self.rg_groups:
+            row = company_dissatisfaction[self.cs(self.group_company[g], 0):self.cs(self.group_company[g], self.num_students)]
+            for _ in self.rg_terms:
+                coefficients.extend(row)
+        return coefficients
+
+    def decode(self, index):
+        # (group, term, student) of a flat (group, term, student) index
+        gt, s = divmod(index, self.num_students)
+        g, t = divmod(gt, self.num_terms)
+        return g, t, s
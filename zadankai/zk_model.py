@@ -0,0 +1,330 @@
+#!/usr/local/bin/python3
+
+from ortools.constraint_solver import pywrapcp
+from zadankai.zk_monitor import StopMonitor, TelemetryMonitor
+from zadankai.zk_output import columns_from_hint
+
+
+class ZadankaiModel:
+    # Common core of the zk models: one assignment variable per (group, term, student) of a
+    # ZadankaiIndex, headcounts, visits and dissatisfaction, plus the search and output.
+    # A variant sets the attributes its packs read, then lists them in:
+    #   PACKS        constraint packs (see zk_packs), applied in order
+    #   OBJECTIVES   objective packs by role: 'weighted' for solve, 'primary' and 'secondary'
+    #                for the two stages of solve_staged, 'lower_bound' for the gap stopping rule
+    #   WEIGHTS      the (axis, key) entries of the weights that the 'weighted' objective reads
+    PACKS = ()
+    OBJECTIVES = {}
+    WEIGHTS = ()
+
+    __DEFAULT_NEXT_VAR = pywrapcp.Solver.CHOOSE_RANDOM
+    __DEFAULT_NEXT_VALUE = pywrapcp.Solver.ASSIGN_MAX_VALUE
+
+    def __init__(self, index, combined_ratings, debug=False, history=None):
+        self.csp = pywrapcp.Solver("zadankai")
+        self.index = index
+        self.combined_ratings = combined_ratings
+        self.solution_collector = None
+        self.stop_reason = None
+        self.debug = debug
+        self.ttl_duplicates = None
+        self.collected = []
+
+        self.__process_history(history)
+
+        self.__make_variables()
+        self.__make_expressions()
+        for pack in self.PACKS:
+            pack(self)
+
+    def __process_history(self, history):
+        # history[t][s] is the Group Student s attended in an earlier Term that is already fixed
+        self.history = history or []
+        self.visited_groups = set()
+        self.prior_company_visits = {}
+        for column in self.history:
+            for s, g in enumerate(column):
+                self.visited_groups.add(self.index.gs(g, s))
+                cs = self.index.cs(self.index.group_company[g], s)
+                self.prior_company_visits[cs] = self.prior_company_visits.get(cs, 0) + 1
+
+    def __make_variables(self):
+        index = self.index
+        # Names are only worth their memory when debugging the model
+        if self.debug:
+            self.assignments_flat = [
+                self.csp.BoolVar(f"assignment(g{g}, t{t}, s{s})")
+                for g in index.rg_groups
+                for t in index.rg_terms
+                for s in index.rg_students
+            ]
+        else:
+            self.assignments_flat = [
+                self.csp.BoolVar()
+                for _ in range(index.num_groups * index.num_terms * index.num_students)
+            ]
+
+    def __make_expressions(self):
+        index = self.index
+        num_cells = index.num_groups * index.num_terms * index.num_students
+
+        self.headcounts_flat = [
+            self.csp.Sum(self.assignments_flat[index.students(g, t)])
+            for g in index.rg_groups
+            for t in index.rg_terms
+        ]
+
+        self.company_dissatisfaction = index.company_dissatisfaction(self.combined_ratings)
+        dissatisfaction_coefficients = index.dissatisfaction_coefficients(self.company_dissatisfaction)
+
+        self.ttl_dissatisfaction = self.csp.ScalProd(self.assignments_flat, dissatisfaction_coefficients)
+        self.avg_dissatisfaction = self.ttl_dissatisfaction // num_cells
+        self.var_dissatisfaction = self.csp.Sum([
+            (assignment * coefficient - self.avg_dissatisfaction).Square()
+            for assignment, coefficient in zip(self.assignments_flat, dissatisfaction_coefficients)
+        ]) // num_cells
+
+        # How many times each Group sees each Student
+        self.combined_assignments_flat = [
+            self.csp.Sum([
+                self.assignments_flat[index.gts(g, t, s)]
+                for t in index.rg_terms
+            ])
+            for g in index.rg_groups
+            for s in index.rg_students
+        ]
+
+    def __make_solution_collector(self):
+        collector = self.csp.LastSolutionCollector()
+
+        collector.Add(self.assignments_flat)
+        collector.Add(self.headcounts_flat)
+        for expressions in self.collected:
+            collector.Add(expressions)
+
+        collector.Add(self.ttl_dissatisfaction)
+
+        return collector
+
+    def __make_warm_start(self, warm_start):
+        if warm_start is True:
+            if self.solution_collector is None or self.solution_collector.SolutionCount() == 0:
+                return None
+            values = self._collect(self.assignments_flat)
+        else:
+            # Columnar assignment: warm_start[t][s] is the Group of Student s in Term t
+            values = [
+                int(warm_start[t][s] == g)
+                for g in self.index.rg_groups
+                for t in self.index.rg_terms
+                for s in self.index.rg_students
+            ]
+        assignment = self.csp.Assignment()
+        assignment.Add(self.assignments_flat)
+        for variable, value in zip(self.assignments_flat, values):
+            assignment.SetValue(variable, value)
+        return assignment
+
+    def __make_hint_phase(self, hint):
+        # Unlike a warm start, a hint may be partially invalid for this input: its assignments are
+        # branched on first, preferring 1, and the ones that do not fit are undone by backtracking
+        index = self.index
+        columns = columns_from_hint(hint, index.num_groups_per_company, index.num_terms, index.num_students)
+        hinted = [
+            self.assignments_flat[index.gts(g, t, s)]
+            for t, column in enumerate(columns)
+            for s, g in enumerate(column)
+            if g is not None and index.gs(g, s) not in self.visited_groups
+        ]
+        if not hinted:
+            return None
+        return self.csp.Phase(hinted, self.csp.CHOOSE_FIRST_UNBOUND, self.csp.ASSIGN_MAX_VALUE)
+
+    def __make_decision_builder(self, next_var, next_value, warm_start, hint=None):
+        phase = self.csp.Phase(self.assignments_flat, next_var, next_value)
+        hint_phase = self.__make_hint_phase(hint) if hint is not None else None
+        if hint_phase is not None:
+            phase = self.csp.Compose([hint_phase, phase])
+        if warm_start is None:
+            return phase
+        # Replay the warm start first so its objective bounds the regular search
+        return self.csp.Try([self.csp.RestoreAssignment(warm_start), phase])
+
+    def solve(self, weights, next_var=__DEFAULT_NEXT_VAR, next_value=__DEFAULT_NEXT_VALUE, max_timeout=60, warm_start=False, telemetry=None, telemetry_interval=1.0,
+              stall_timeout=None, objective_threshold=None, relative_threshold=None, gap=None, output_format='nested', hint=None):
+        warm_start = self.__make_warm_start(warm_start) if warm_start else None
+        objective_var = self.OBJECTIVES['weighted'](self, weights)
+        self.solution_collector = self.__make_solution_collector()
+        monitors = [
+            self.solution_collector,
+            self.csp.Minimize(objective_var, 1),
+            self.csp.TimeLimit(int(max_timeout * 1000)),
+        ]
+        if telemetry is not None:
+            monitors.append(TelemetryMonitor(self.csp, objective_var.Var(), telemetry, telemetry_interval))
+        stop_monitor = None
+        if stall_timeout is not None or objective_threshold is not None or relative_threshold is not None or gap is not None:
+            stop_monitor = StopMonitor(
+                self.csp, objective_var.Var(),
+                stall_timeout=stall_timeout,
+                objective_threshold=objective_threshold,
+                relative_threshold=relative_threshold,
+                lower_bound=self.objective_lower_bound(weights) if gap is not None else None,
+                gap=gap,
+            )
+            monitors.append(stop_monitor)
+        start_time = self.csp.WallTime()
+        solved = self.csp.Solve(
+            self.__make_decision_builder(next_var, next_value, warm_start, hint),
+            monitors,
+        )
+        self.stop_reason = self.__stop_reason(stop_monitor, start_time, max_timeout)
+        if solved:
+            s_assignments = self.__format_solution(output_format)
+            self.csp.EndSearch()
+            return s_assignments
+        else:
+            return None
+
+    def __stop_reason(self, stop_monitor, start_time, max_timeout):
+        if stop_monitor is not None and stop_monitor.stop_reason is not None:
+            return stop_monitor.stop_reason
+        if self.csp.WallTime() - start_time >= max_timeout * 1000:
+            return 'time_limit'
+        return 'completed'
+
+    def __stage_monitors(self, objective, max_timeout, telemetry, telemetry_interval, stall_timeout):
+        # Monitors of one solve_staged stage, and its StopMonitor when stall_timeout is set
+        minimize = self.csp.Minimize(objective, 1)
+        monitors = [self.solution_collector, minimize, self.csp.TimeLimit(int(max_timeout * 1000))]
+        if telemetry is not None:
+            monitors.append(TelemetryMonitor(self.csp, objective.Var(), telemetry, telemetry_interval))
+        stop_monitor = StopMonitor(self.csp, objective.Var(), stall_timeout=stall_timeout) if stall_timeout is not None else None
+        if stop_monitor is not None:
+            monitors.append(stop_monitor)
+        return minimize, monitors, stop_monitor
+
+    # Telemetry samples restart at each stage, and stall_timeout applies to each stage. Objective
+    # thresholds and gaps are not supported: they are stated for the weighted objective.
+    # stop_reason is the second stage's. If stage 1 finds nothing in its share, the rest of
+    # max_timeout goes to one solve of the weighted objective instead, whose stop_reason it is.
+    # Each call posts a permanent primary_objective <= primary_bound constraint on a fresh bound
+    # variable: later solves are not restricted by it, but repeated staged solves grow the model.
+    def solve_staged(self, weights, next_var=__DEFAULT_NEXT_VAR, next_value=__DEFAULT_NEXT_VALUE, max_timeout=60, stage_split=0.5, tolerance=0, output_format='nested', hint=None,
+                     telemetry=None, telemetry_interval=1.0, stall_timeout=None):
+        # Stage 1: the primary objective alone
+        primary_objective = self.OBJECTIVES['primary'](self, weights)
+        self.solution_collector = self.__make_solution_collector()
+        primary_timeout = max_timeout * stage_split
+        primary_minimize, monitors, stop_monitor = self.__stage_monitors(primary_objective, primary_timeout, telemetry, telemetry_interval, stall_timeout)
+        start_time = self.csp.WallTime()
+        solved = self.csp.Solve(self.__make_decision_builder(next_var, next_value, None, hint), monitors)
+        self.stop_reason = self.__stop_reason(stop_monitor, start_time, primary_timeout)
+        if not solved:
+            # Nothing to hold the primary objective to: the rest of the time goes to the weighted one
+            return self.solve(
+                weights, next_var, next_value,
+                max_timeout=max_timeout - (self.csp.WallTime() - start_time) / 1000,
+                telemetry=telemetry, telemetry_interval=telemetry_interval, stall_timeout=stall_timeout,
+                output_format=output_format, hint=hint,
+            )
+
+        # Stage 2: the secondary objective, with the primary held within tolerance of the stage 1 optimum
+        primary_bound = self.csp.IntVar(primary_objective.Min(), primary_objective.Max(), "primary_bound")
+        self.csp.Add(primary_objective <= primary_bound)
+        bound = self.csp.Assignment()
+        bound.Add(primary_bound)
+        bound.SetValue(primary_bound, min(primary_minimize.Best() + tolerance, primary_objective.Max()))
+
+        warm_start = self.__make_warm_start(True)
+        self.solution_collector = self.__make_solution_collector()
+        secondary_timeout = max_timeout * (1 - stage_split)
+        _, monitors, stop_monitor = self.__stage_monitors(
+            self.OBJECTIVES['secondary'](self, weights), secondary_timeout, telemetry, telemetry_interval, stall_timeout
+        )
+        start_time = self.csp.WallTime()
+        solved = self.csp.Solve(
+            self.csp.Compose([
+                self.csp.RestoreAssignment(bound),
+                self.__make_decision_builder(next_var, next_value, warm_start),
+            ]),
+            monitors,
+        )
+        self.stop_reason = self.__stop_reason(stop_monitor, start_time, secondary_timeout)
+        if solved:
+            s_assignments = self.__format_solution(output_format)
+            self.csp.EndSearch()
+            return s_assignments
+        else:
+            return None
+
+    def best_dissatisfaction(self):
+        # Sum over Students of the dissatisfaction of their num_terms favourite Groups
+        index = self.index
+        return sum(
+            sum(sorted(self.company_dissatisfaction[index.cs(c, s)] for c in index.group_company)[:index.num_terms])
+            for s in index.rg_students
+        )
+
+    def objective_lower_bound(self, weights):
+        return self.OBJECTIVES['lower_bound'](self, weights)
+
+    def objectives(self):
+        if self.solution_collector is None or self.solution_collector.SolutionCount() == 0:
+            return None
+        s_headcounts = self._collect(self.headcounts_flat)
+        return {
+            'balance': sum(
+                abs(s_headcounts[self.index.gt(g, t)] - int(self.target_headcounts[g]))
+                for g in self.index.rg_groups
+                for t in self.index.rg_terms
+            ),
+            'dissatisfaction': self.solution_collector.Value(0, self.ttl_dissatisfaction),
+            'duplicates': self.solution_collector.Value(0, self.ttl_duplicates) if self.ttl_duplicates is not None else 0,
+        }
+
+    def _collect(self, expressions):
+        return [self.solution_collector.Value(0, e) for e in expressions]
+
+    def _group_students(self):
+        # group_students[g][t] lists the Students of Group g in Term t
+        index = self.index
+        group_students = [[[] for _ in index.rg_terms] for _ in index.rg_groups]
+        for i, value in enumerate(self._collect(self.assignments_flat)):
+            if value == 1:
+                g, t, s = index.decode(i)
+                group_students[g][t].append(s)
+        return group_students
+
+    def _format_assignments(self):
+        # Company -> Group within the Company -> Term -> Students
+        index = self.index
+        group_students = self._group_students()
+        return {
+            c: {
+                gi: {t: group_students[g][t] for t in index.rg_terms}
+                for gi, g in enumerate(index.company_groups[c])
+            }
+            for c in index.rg_companies
+        }
+
+    def __format_solution(self, output_format):
+        if output_format == 'columnar':
+            return self.__format_columnar()
+        return self._format_assignments()
+
+    def __format_columnar(self):
+        # One row per Term giving each Student's Group
+        index = self.index
+        columns = [[None] * index.num_students for _ in index.rg_terms]
+        for i, value in enumerate(self._collect(self.assignments_flat)):
+            if value == 1:
+                g, t, s = index.decode(i)
+                columns[t][s] = g
+        s_headcounts = self._collect(self.headcounts_flat)
+        return {
+            'groupCompany': list(index.group_company),
+            'assignments': columns,
+            'headcounts': [[s_headcounts[index.gt(g, t)] for g in index.rg_groups] for t in index.rg_terms],
+            'objectives': self.objectives(),
+        }
@@ -0,0 +1,157 @@
+#!/usr/local/bin/python3
+
+import json
+import os
+import time
+from ortools.constraint_solver import pywrapcp
+
+# Decisions between two clock reads, so sampling stays cheap on fast searches
+CLOCK_CHECK_PERIOD = 100
+
+
+class TelemetryMonitor(pywrapcp.SearchMonitor):
+    def __init__(self, csp, objective_var, sink, interval=1.0):
+        super().__init__(csp)
+        self.csp = csp
+        self.objective_var = objective_var
+        self.sink = sink
+        self.interval = interval
+
+        self.start_time = None
+        self.last_sample_time = None
+        self.decisions = 0
+        self.objective = None
+        self.best_objective = None
+
+    def EnterSearch(self):
+        self.start_time = time.monotonic()
+        self.last_sample_time = self.start_time
+        self.decisions = 0
+        self.objective = None
+        self.best_objective = None
+
+    def BeginNextDecision(self, decision_builder):
+        self.decisions += 1
+        if self.decisions % CLOCK_CHECK_PERIOD == 0:
+            now = time.monotonic()
+            if now - self.last_sample_time >= self.interval:
+                self.__sample(now, 'progress')
+
+    def AtSolution(self):
+        self.objective = self.objective_var.Value()
+        if self.best_objective is None or self.objective < self.best_objective:
+            self.best_objective = self.objective
+        self.__sample(time.monotonic(), 'solution')
+        return True
+
+    def ExitSearch(self):
+        self.__sample(time.monotonic(), 'exit')
+
+    def __sample(self, now, event):
+        self.last_sample_time = now
+        self.sink({
+            'event': event,
+            'elapsed': now - self.start_time,
+            'branches': self.csp.Branches(),
+            'failures': self.csp.Failures(),
+            'solutions': self.csp.Solutions(),
+            'objective': self.objective,
+            'best_objective': self.best_objective,
+            'memory': self.csp.MemoryUsage(),
+        })
+
+
+class JsonLinesSink:
+    def __init__(self, path):
+        self.file = open(path, 'a')
+
+    def __call__(self, sample):
+        self.file.write(json.dumps(sample) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class PrometheusSink:
+    def __init__(self, path, job='zadankai'):
+        self.path = path
+        self.job = job
+
+    def __call__(self, sample):
+        lines = []
+        for key, value in sample.items():
+            if key == 'event' or value is None:
+                continue
+            lines.append(f"# TYPE zadankai_search_{key} gauge")
+            lines.append(f'zadankai_search_{key}{{job="{self.job}"}} {value}')
+        # Write then rename so scrapers never read a half-written file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        pass
+
+
+def make_sink(telemetry):
+    if 'jsonl' in telemetry:
+        return JsonLinesSink(telemetry['jsonl'])
+    if 'prometheus' in telemetry:
+        return PrometheusSink(telemetry['prometheus'], telemetry.get('job', 'zadankai'))
+    raise ValueError(f"Unknown telemetry sink: {telemetry}")
+
+
+class StopMonitor(pywrapcp.SearchMonitor):
+    def __init__(self, csp, objective_var, stall_timeout=None, objective_threshold=None, relative_threshold=None, lower_bound=None, gap=None):
+        super().__init__(csp)
+        self.csp = csp
+        self.objective_var = objective_var
+        self.stall_timeout = stall_timeout
+        self.objective_threshold = objective_threshold
+        self.relative_threshold = relative_threshold
+        self.lower_bound = lower_bound
+        self.gap = gap
+
+        self.decisions = 0
+        self.last_improvement_time = None
+        self.first_objective = None
+        self.best_objective = None
+        self.stop_reason = None
+
+    def EnterSearch(self):
+        self.decisions = 0
+        self.last_improvement_time = None
+        self.first_objective = None
+        self.best_objective = None
+        self.stop_reason = None
+
+    def BeginNextDecision(self, decision_builder):
+        self.decisions += 1
+        # Stalling only counts once there is a solution to fall back on
+        if self.stall_timeout is None or self.last_improvement_time is None:
+            return
+        if self.decisions % CLOCK_CHECK_PERIOD == 0:
+            if time.monotonic() - self.last_improvement_time >= self.stall_timeout:
+                self.stop_reason = 'stall'
+                self.csp.FinishCurrentSearch()
+
+    def AtSolution(self):
+        objective = self.objective_var.Value()
+        if self.first_objective is None:
+            self.first_objective = objective
+        if self.best_objective is None or objective < self.best_objective:
+            self.best_objective = objective
+            self.last_improvement_time = time.monotonic()
+
+        if self.objective_threshold is not None and self.best_objective <= self.objective_threshold:
+            self.stop_reason = 'threshold'
+        elif self.relative_threshold is not None and self.best_objective <= self.relative_threshold * self.first_objective:
+            self.stop_reason = 'relative_threshold'
+        elif self.gap is not None and self.best_objective - self.lower_bound <= self.gap * max(abs(self.best_objective), 1):
+            self.stop_reason = 'gap'
+        if self.stop_reason is not None:
+            # Returning False is not enough: the collector and Minimize still ask to continue
+            self.csp.FinishCurrentSearch()
+        return True
@@ -0,0 +1,189 @@
+#!/usr/local/bin/python3
+
+# Columnar results: groups are numbered across companies (groupCompany maps them back),
+# assignments[t][s] is the group of student s in term t and headcounts[t][g] its size.
+
+from zadankai.zk_index import ZadankaiIndex
+from zadankai.zk_ratings import CombinedRatings
+
+UNASSIGNED = -1
+
+
+# ZadankaiModel.objectives of a zk_alt schedule, for engines without one model covering all of it
+def _objectives(json_input, columns):
+    companies = json_input['companies']
+    students = json_input['students']
+    index = ZadankaiIndex(companies['count'], students['count'], len(columns), companies['groups'])
+    company_dissatisfaction = index.company_dissatisfaction(
+        CombinedRatings(companies['ratings'], students['ratings'], index.num_companies, index.num_students)
+    )
+    target_headcount = int(index.num_students / index.num_groups)
+
+    balance = 0
+    dissatisfaction = 0
+    company_visits = {}
+    for column in columns:
+        headcounts = [0] * index.num_groups
+        for s, g in enumerate(column):
+            if g is None:
+                continue
+            headcounts[g] += 1
+            cs = index.cs(index.group_company[g], s)
+            dissatisfaction += company_dissatisfaction[cs]
+            company_visits[cs] = company_visits.get(cs, 0) + 1
+        balance += sum(abs(headcount - target_headcount) for headcount in headcounts)
+    return {
+        'balance': balance,
+        'dissatisfaction': dissatisfaction,
+        'duplicates': sum(visits - 1 for visits in company_visits.values() if visits > 1),
+    }
+
+
+def columnar_from_columns(json_input, columns):
+    # For engines that produce columns[t][s] but no model to report headcounts and objectives from
+    group_company = [c for c, num_groups in enumerate(json_input['companies']['groups']) for _ in range(num_groups)]
+    headcounts = [[0] * len(group_company) for _ in columns]
+    for t, column in enumerate(columns):
+        for g in column:
+            if g is not None:
+                headcounts[t][g] += 1
+    return {
+        'groupCompany': group_company,
+        'assignments': columns,
+        'headcounts': headcounts,
+        'objectives': _objectives(json_input, columns),
+    }
+
+
+def columnar_from_nested(json_input, nested):
+    # For engines that only produce the nested company -> group -> term -> students format
+    groups = json_input['companies']['groups']
+    num_terms = json_input['terms']['count']
+    columns = [[None] * json_input['students']['count'] for _ in range(num_terms)]
+    g = 0
+    for c, num_groups in enumerate(groups):
+        for gi in range(num_groups):
+            for t in range(num_terms):
+                for s in nested[c][gi][t]:
+                    columns[t][s] = g
+            g += 1
+    return columnar_from_columns(json_input, columns)
+
+
+def _arrays(columnar):
+    import numpy as np
+
+    assignments = [[UNASSIGNED if g is None else g for g in row] for row in columnar['assignments']]
+    arrays = {
+        'assignments': np.array(assignments, dtype=np.int32),
+        'headcounts': np.array(columnar['headcounts'], dtype=np.int32),
+        'group_company': np.array(columnar['groupCompany'], dtype=np.int32),
+    }
+    for name, value in (columnar['objectives'] or {}).items():
+        arrays[name] = np.array(value, dtype=np.int64)
+    return arrays
+
+
+def write_npz(path, columnar):
+    import numpy as np
+
+    np.savez_compressed(path, **_arrays(columnar))
+
+
+def write_npy(path, columnar):
+    # Only the terms x students assignment matrix; use write_npz for the summaries
+    import numpy as np
+
+    np.save(path, _arrays(columnar)['assignments'])
+
+
+def nested_from_columns(json_input, columns):
+    # columns[t][s] is the group of student s in term t, groups numbered across companies
+    groups = json_input['companies']['groups']
+    slots = [(c, gi) for c, num_groups in enumerate(groups) for gi in range(num_groups)]
+    nested = {
+        c: {gi: {t: [] for t in range(len(columns))} for gi in range(num_groups)}
+        for c, num_groups in enumerate(groups)
+    }
+    for t, column in enumerate(columns):
+        for s, g in enumerate(column):
+            c, gi = slots[g]
+            nested[c][gi][t].append(s)
+    return nested
+
+
+def _index(value):
+    # Keys come back as strings from a JSON round trip; anything else that is not a whole number is unusable
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+
+def _hint_visits(hint):
+    # (term, student, company, group within company) for every assignment in a previous result.
+    # Shapes without assignments (infeasible, npz/npy paths, failed runs) simply yield nothing.
+    if not isinstance(hint, dict):
+        return
+    if 'assignments' in hint and not isinstance(hint['assignments'], list):
+        # zk_wrap's wrapped output, as with auto mode, stopping or notes
+        hint = hint['assignments']
+        if not isinstance(hint, dict):
+            return
+    if 'assignments' in hint:
+        group_company = hint.get('groupCompany')
+        if not isinstance(group_company, list) or not all(_index(c) is not None for c in group_company):
+            return
+        group_index = [g - group_company.index(c) for g, c in enumerate(group_company)]
+        for t, column in enumerate(hint['assignments']):
+            if not isinstance(column, list):
+                continue
+            for s, g in enumerate(column):
+                g = _index(g)
+                if g is not None and 0 <= g < len(group_company):
+                    yield t, s, group_company[g], group_index[g]
+        return
+    # Nested, possibly with the string keys it gets from a JSON round trip
+    for c, company_groups in hint.items():
+        if _index(c) is None or not isinstance(company_groups, dict):
+            continue
+        for gi, group_terms in company_groups.items():
+            if isinstance(group_terms, list):
+                # zk's Company -> Term -> Students, Companies being single Groups
+                for s in group_terms:
+                    yield _index(gi), _index(s), _index(c), 0
+            elif isinstance(group_terms, dict):
+                for t, students in group_terms.items():
+                    for s in students if isinstance(students, list) else []:
+                        yield _index(t), _index(s), _index(c), _index(gi)
+
+
+def columnar_hint(groups, columns):
+    # Columns (groups numbered across companies) in the columnar shape columns_from_hint reads
+    return {'groupCompany': [c for c, num_groups in enumerate(groups) for _ in range(num_groups)], 'assignments': columns}
+
+
+def columns_from_hint(hint, groups, num_terms, num_students):
+    # Columns for the current input from a previous nested or columnar result. Groups are matched
+    # by (company, group within company), so a changed group count only loses the groups that went
+    # away. Anything that no longer fits is dropped: out of range terms, students, companies or
+    # groups, a second group for a student in the same term, or a second visit to the same group.
+    first_group = [0]
+    for num_groups in groups:
+        first_group.append(first_group[-1] + num_groups)
+    columns = [[None] * num_students for _ in range(num_terms)]
+    visited = set()
+    for t, s, c, gi in _hint_visits(hint):
+        if None in (t, s, c, gi):
+            continue
+        if not (0 <= t < num_terms and 0 <= s < num_students and 0 <= c < len(groups) and 0 <= gi < groups[c]):
+            continue
+        g = first_group[c] + gi
+        if columns[t][s] is not None or (g, s) in visited:
+            continue
+        columns[t][s] = g
+        visited.add((g, s))
+    return columns
@@ -0,0 +1,129 @@
+#!/usr/local/bin/python3
+
+# Building blocks of the zk models (see zk_model.ZadankaiModel).
+#
+# Constraint packs take the model, post constraints and/or add expressions to it, and register
+# what the solution collector should keep in model.collected. Objective packs take the model and
+# the weights and return an objective expression; a model variant names its own in OBJECTIVES.
+
+
+# Each Term, a Student can only be assigned to one Group
+def one_group_per_term(model):
+    index = model.index
+    for term in index.rg_terms:
+        for student in index.rg_students:
+            model.csp.Add(model.csp.Sum([
+                model.assignments_flat[index.gts(g, term, student)]
+                for g in index.rg_groups
+            ]) == 1)
+
+
+# Each Group sees each Student at most once, counting the Terms in history
+def group_once(model):
+    for gs, combined_assignment in enumerate(model.combined_assignments_flat):
+        model.csp.Add(combined_assignment <= (0 if gs in model.visited_groups else 1))
+
+
+# Each Group has between model.min_headcounts[g] and model.max_headcounts[g] Students per Term
+def headcount_range(model):
+    index = model.index
+    for group in index.rg_groups:
+        for term in index.rg_terms:
+            model.csp.Add(model.headcounts_flat[index.gt(group, term)] >= model.min_headcounts[group])
+            model.csp.Add(model.headcounts_flat[index.gt(group, term)] <= model.max_headcounts[group])
+
+
+# Distance of every headcount to model.target_headcounts[g]
+def balance(model):
+    index = model.index
+    model.deltas_flat = [
+        model.headcounts_flat[index.gt(g, t)] - int(model.target_headcounts[g])
+        for g in index.rg_groups
+        for t in index.rg_terms
+    ]
+
+    model.abs_deltas_flat = [abs(delta) for delta in model.deltas_flat]
+
+    model.ttl_delta = model.csp.Sum(model.abs_deltas_flat)
+    model.avg_delta = model.ttl_delta // (index.num_groups * index.num_terms)
+    model.var_delta = model.csp.Sum([
+        delta.Square()
+        for delta in model.deltas_flat
+    ]) // (index.num_groups * index.num_terms)
+
+    model.collected += [model.deltas_flat, model.abs_deltas_flat, model.ttl_delta, model.avg_delta, model.var_delta]
+
+
+# Repeat visits of a Student to a Company across its Groups, counting the Terms in history
+def duplicates(model):
+    index = model.index
+    csp = model.csp
+    model.duplicates_flat = []
+    for company in index.rg_companies:
+        for student in index.rg_students:
+            summed = csp.Sum([
+                model.combined_assignments_flat[index.gs(g, student)]
+                for g in index.company_groups[company]
+            ])
+            prior_visits = model.prior_company_visits.get(index.cs(company, student), 0)
+            if prior_visits:
+                summed = summed + prior_visits
+            duplicate = csp.IsDifferentVar(summed, csp.IntConst(0)) * csp.IsDifferentVar(summed, csp.IntConst(1)) * (summed - 1)
+            model.duplicates_flat.append(duplicate)
+
+    model.ttl_company_duplicates = [
+        csp.Sum(model.duplicates_flat[index.cs(c, 0):index.cs(c, index.num_students)])
+        for c in index.rg_companies
+    ]
+
+    model.ttl_duplicates = csp.Sum(model.ttl_company_duplicates)
+
+    model.collected += [model.combined_assignments_flat, model.duplicates_flat, model.ttl_company_duplicates, model.ttl_duplicates]
+
+
+def balance_objective(model, weights):
+    return weights['delta']['ttl'] * model.ttl_delta\
+        + weights['delta']['var'] * model.var_delta
+
+
+def weighted_dissatisfaction_objective(model, weights):
+    return weights['satisfaction']['ttl'] * model.ttl_dissatisfaction\
+        + weights['satisfaction']['var'] * model.var_dissatisfaction
+
+
+def balance_dissatisfaction_objective(model, weights):
+    return (weights['delta']['obj'] * balance_objective(model, weights))\
+        + (weights['satisfaction']['obj'] * weighted_dissatisfaction_objective(model, weights))
+
+
+def balance_dissatisfaction_lower_bound(model, weights):
+    # At best every Student sees its num_terms favourite Groups, and balance is perfect
+    return weights['satisfaction']['obj'] * weights['satisfaction']['ttl'] * model.best_dissatisfaction()
+
+
+def duplicates_objective(model, weights):
+    return model.ttl_duplicates
+
+
+def fixed_dissatisfaction_objective(model, weights):
+    return (20 * 100 * model.avg_dissatisfaction + 80 * model.var_dissatisfaction) // 100
+
+
+# Without a 'duplicates' entry, zk_alt ignores the weights and blends 80/20
+def _duplicate_weights(weights):
+    if 'duplicates' in weights:
+        return weights['duplicates']['obj'], weights['satisfaction']['obj']
+    return 80, 20
+
+
+def duplicates_dissatisfaction_objective(model, weights):
+    duplicate_weight, dissatisfaction_weight = _duplicate_weights(weights)
+    return (model.ttl_duplicates * duplicate_weight + fixed_dissatisfaction_objective(model, weights) * dissatisfaction_weight) // 100
+
+
+def duplicates_dissatisfaction_lower_bound(model, weights):
+    # At best every Student sees its num_terms favourite Groups, without duplicates
+    index = model.index
+    avg_dissatisfaction = model.best_dissatisfaction() // (index.num_groups * index.num_terms * index.num_students)
+    _, dissatisfaction_weight = _duplicate_weights(weights)
+    return ((20 * 100 * avg_dissatisfaction) // 100 * dissatisfaction_weight) // 100
@@ -0,0 +1,93 @@
+#!/usr/local/bin/python3
+
+# Ratings come in one of two shapes per side:
+#   dense:  {'values': [[rating, ...], ...], 'weight': w}
+#           companies.values is C x S, students.values is S x C
+#   sparse: {'preferences': [[[index, rating], ...], ...], 'default': d, 'weight': w}
+#           one list per company (of students) or per student (of companies);
+#           unlisted pairs get the default rating (0 when omitted)
+
+
+def is_sparse(ratings):
+    return 'preferences' in ratings
+
+
+def lookup(ratings):
+    # rating(row, col), row being the company for company ratings and the student for student ratings
+    if not is_sparse(ratings):
+        values = ratings['values']
+        return lambda row, col: values[row][col]
+    default = ratings.get('default', 0)
+    rows = [dict(preferences) for preferences in ratings['preferences']]
+    return lambda row, col: rows[row].get(col, default)
+
+
+def subset(ratings, rows=None, cols=None):
+    # Same ratings restricted (and renumbered) to the given rows and/or columns
+    if not is_sparse(ratings):
+        values = ratings['values'] if rows is None else [ratings['values'][r] for r in rows]
+        if cols is not None:
+            values = [[row[c] for c in cols] for row in values]
+        return {**ratings, 'values': values}
+    preferences = ratings['preferences'] if rows is None else [ratings['preferences'][r] for r in rows]
+    if cols is not None:
+        local = {c: i for i, c in enumerate(cols)}
+        preferences = [[[local[c], r] for c, r in row if c in local] for row in preferences]
+    return {**ratings, 'preferences': preferences}
+
+
+def _scale(rating):
+    return int((rating / 4) * 100)
+
+
+def combine(c_rating, s_rating, c_weight, s_weight):
+    combined = c_weight * _scale(c_rating) + s_weight * _scale(s_rating)
+    combined /= c_weight + s_weight
+    return int(combined)
+
+
+class CombinedRatings:
+    # Combined rating of every (company, student) pair, addressed by company * num_students + student.
+    # A flat list as soon as either side is dense, since every pair is then expressed; two sparse
+    # sides only store the pairs either of them expressed.
+
+    def __init__(self, company_ratings, student_ratings, num_companies, num_students):
+        self.num_students = num_students
+        c_weight = company_ratings['weight']
+        s_weight = student_ratings['weight']
+        c_rating = lookup(company_ratings)
+        s_rating = lookup(student_ratings)
+
+        if not is_sparse(company_ratings) or not is_sparse(student_ratings):
+            self.default = None
+            self.ratings = [
+                combine(c_rating(c, s), s_rating(s, c), c_weight, s_weight)
+                for c in range(num_companies)
+                for s in range(num_students)
+            ]
+            return
+
+        c_pairs = {(c, s) for c, row in enumerate(company_ratings['preferences']) for s, _ in row}
+        s_pairs = {(c, s) for s, row in enumerate(student_ratings['preferences']) for c, _ in row}
+
+        self.default = combine(
+            company_ratings.get('default', 0), student_ratings.get('default', 0), c_weight, s_weight
+        )
+        self.ratings = {
+            c * num_students + s: combine(c_rating(c, s), s_rating(s, c), c_weight, s_weight)
+            for c, s in c_pairs | s_pairs
+        }
+
+    def __getitem__(self, index):
+        if self.default is None:
+            return self.ratings[index]
+        return self.ratings.get(index, self.default)
+
+    def expressed(self):
+        # (company, student, rating) for every pair stored explicitly
+        if self.default is None:
+            items = enumerate(self.ratings)
+        else:
+            items = self.ratings.items()
+        for index, rating in items:
+            yield index // self.num_students, index % self.num_students, rating
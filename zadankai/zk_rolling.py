@@ -0,0 +1,72 @@
+#!/usr/local/bin/python3
+
+import time
+from zadankai import zk_decompose
+from zadankai.zk_alt import ZadankaiCSP
+from zadankai.zk_output import columnar_hint
+
+# Share of a step's time given to re-opening the previous term when reopen is on
+REOPEN_SHARE = 0.25
+
+
+# The model build counts against max_timeout, and only what is left is searched
+def _solve_window(json_input, history, num_terms, max_timeout, warm_start=False, hint_columns=None):
+    started = time.monotonic()
+    zk_csp = ZadankaiCSP(json_input['companies'], json_input['students'], {'count': num_terms}, history=history)
+    search_timeout = max_timeout - (time.monotonic() - started)
+    if search_timeout <= 0:
+        return None
+    hint = columnar_hint(json_input['companies']['groups'], hint_columns) if hint_columns else None
+    result = zk_csp.solve(json_input['weights'], max_timeout=search_timeout, warm_start=warm_start, output_format='columnar', hint=hint)
+    return result['assignments'] if result is not None else None
+
+
+# Solves one term at a time with all earlier terms fixed, yielding (term, column) as soon as
+# a term is final; column[s] is the group of student s. With lookahead, each step also plans
+# the following terms but only keeps the first. With reopen, each step gets a short second
+# pass over the previous term and the current one, warm started from what is already there,
+# so terms are yielded one step late. hint_columns (zk_output.columns_from_hint) guide each
+# step's search for the terms it covers. A step whose search finds nothing in time takes a
+# greedy column instead (zk_decompose.construct_term); its term goes into unrepaired when
+# that column's headcounts could not be brought into range. Steps and reopen passes share
+# maxTimeout: each step gets an even share of what is left of it, time spent by the caller
+# between terms included, and gives REOPEN_SHARE of that share to its reopen pass.
+def solve_terms(json_input, lookahead=0, reopen=False, hint_columns=None, unrepaired=None):
+    num_terms = json_input['terms']['count']
+    deadline = time.monotonic() + json_input['maxTimeout']
+
+    columns = []
+    for t in range(num_terms):
+        step_budget = max(0.0, deadline - time.monotonic()) / (num_terms - t)
+        reopen_timeout = step_budget * REOPEN_SHARE if reopen and t > 0 else 0
+        step_timeout = step_budget - reopen_timeout
+        window_terms = min(lookahead + 1, num_terms - t)
+        window_hint = hint_columns[t:t + window_terms] if hint_columns else None
+        window = _solve_window(json_input, columns, window_terms, step_timeout, hint_columns=window_hint)
+        if window is not None:
+            columns.append(window[0])
+        else:
+            column, repaired = zk_decompose.construct_term(json_input, columns, window_hint[0] if window_hint else None)
+            columns.append(column)
+            if not repaired and unrepaired is not None:
+                unrepaired.append(t)
+
+        if reopen and t > 0:
+            # Never worse: the search replays the current pair before looking further
+            improved = _solve_window(json_input, columns[:t - 1], 2, reopen_timeout, warm_start=columns[t - 1:])
+            if improved is not None:
+                columns[t - 1:] = improved
+            yield t - 1, columns[t - 1]
+        elif not reopen:
+            yield t, columns[t]
+
+    if reopen and columns:
+        yield num_terms - 1, columns[-1]
+
+
+# Returns the columns and the terms whose greedy fallback headcounts are still out of range
+def solve(json_input, lookahead=0, reopen=False, hint_columns=None):
+    unrepaired = []
+    columns = [column for _, column in solve_terms(json_input, lookahead, reopen, hint_columns, unrepaired)]
+    return columns, unrepaired
+
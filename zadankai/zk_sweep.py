@@ -0,0 +1,73 @@
+#!/usr/local/bin/python3
+
+import multiprocessing
+
+OBJECTIVES = ('balance', 'dissatisfaction', 'duplicates')
+
+# Built model shared with forked workers, so they never rebuild it
+_sweep_csp = None
+
+
+def _solve_weights(zk_csp, weights, max_timeout, warm_start, solve_kwargs):
+    assignments = zk_csp.solve(weights, max_timeout=max_timeout, warm_start=warm_start, **solve_kwargs)
+    if assignments is None:
+        return None
+    return {'weights': weights, **zk_csp.objectives(), 'assignments': assignments}
+
+
+def _weighted(zk_csp, weights):
+    # The part of weights the model's objective actually reads (see ZadankaiModel.WEIGHTS)
+    try:
+        return tuple(weights[axis][key] for axis, key in zk_csp.WEIGHTS)
+    except KeyError:
+        raise ValueError(f"{type(zk_csp).__module__} weighs {zk_csp.WEIGHTS}, missing from {weights}")
+
+
+def _sweep_worker(args):
+    weights, max_timeout, solve_kwargs = args
+    return _solve_weights(_sweep_csp, weights, max_timeout, False, solve_kwargs)
+
+
+def dominates(outcome, other):
+    return all(outcome[o] <= other[o] for o in OBJECTIVES) and any(outcome[o] < other[o] for o in OBJECTIVES)
+
+
+def pareto_front(outcomes):
+    front = []
+    for outcome in outcomes:
+        if outcome is None:
+            continue
+        if any(dominates(other, outcome) for other in outcomes if other is not None):
+            continue
+        if any(all(kept[o] == outcome[o] for o in OBJECTIVES) for kept in front):
+            continue
+        front.append(outcome)
+    return front
+
+
+# Solves one built model for each weight vector and keeps the non-dominated outcomes.
+# Without processes, weights are solved in order and each search is warm started
+# from the previous solution. With processes, workers are forked from the built
+# model and each solves one weight vector from scratch. Raises ValueError when the weights
+# miss an entry the model reads, or only differ in entries it ignores.
+def sweep(zk_csp, weights_list, max_timeout=60, processes=None, **solve_kwargs):
+    global _sweep_csp
+
+    weighted = {_weighted(zk_csp, weights) for weights in weights_list}
+    if len(weights_list) > 1 and len(weighted) == 1:
+        raise ValueError(f"The weights only differ outside {zk_csp.WEIGHTS}, which {type(zk_csp).__module__} ignores")
+
+    if processes is None:
+        outcomes = [
+            _solve_weights(zk_csp, weights, max_timeout, True, solve_kwargs)
+            for weights in weights_list
+        ]
+    else:
+        _sweep_csp = zk_csp
+        try:
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                outcomes = pool.map(_sweep_worker, [(w, max_timeout, solve_kwargs) for w in weights_list], chunksize=1)
+        finally:
+            _sweep_csp = None
+
+    return pareto_front(outcomes)
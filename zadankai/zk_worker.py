@@ -0,0 +1,138 @@
+#!/usr/local/bin/python3
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from zadankai.zk_check import check_alt
+from zadankai.zk_wrap import run
+
+# Results kept by serve for repeated requests, oldest dropped first
+CACHE_SIZE = 256
+COLD_START_RUNS = 3
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+# Imports the solver stack that zk_wrap otherwise loads on the first solve
+def preload():
+    start = time.perf_counter()
+    from ortools.constraint_solver import pywrapcp
+
+    for module in ('zk_alt', 'zk_decompose', 'zk_monitor', 'zk_rolling'):
+        importlib.import_module(f'zadankai.{module}')
+
+    pywrapcp.Solver("preload")
+    return _elapsed_ms(start)
+
+
+def _cache_key(event):
+    request = {key: value for key, value in event.items() if key != 'id'}
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+def _solve(event):
+    start = time.perf_counter()
+    try:
+        # zk_wrap prints the solution; keep that out of the response stream
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = json.loads(run(event))
+        return {'result': result, 'elapsedMs': _elapsed_ms(start)}
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}", 'elapsedMs': _elapsed_ms(start)}
+
+
+# Answers NDJSON requests (zk_wrap inputs, optionally with an 'id') with one NDJSON response
+# each, in completion order. The solver stack is loaded once before forking the workers, so no
+# request pays for it; inputs failing check_alt and repeats of a cached request are answered
+# by the dispatching process straight away. Workers are daemonic, so a decomposition request
+# solves its clusters inside its worker instead of in a pool of its own.
+def serve(requests, output, processes=None, log=sys.stderr):
+    started = time.perf_counter()
+    preload_ms = preload()
+    pool = multiprocessing.get_context('fork').Pool(processes or os.cpu_count() or 1)
+    log.write(json.dumps({'ready': True, 'startupMs': _elapsed_ms(started), 'solverImportMs': preload_ms}) + '\n')
+    log.flush()
+
+    cache = {}
+    lock = threading.Lock()
+
+    def respond(response):
+        with lock:
+            output.write(json.dumps(response) + '\n')
+            output.flush()
+
+    def finish(event_id, key):
+        def callback(response):
+            if 'result' in response:
+                with lock:
+                    cache[key] = response['result']
+                    if len(cache) > CACHE_SIZE:
+                        del cache[next(iter(cache))]
+            respond({'id': event_id, **response})
+        return callback
+
+    for index, line in enumerate(requests):
+        if not line.strip():
+            continue
+        start = time.perf_counter()
+        try:
+            event = json.loads(line)
+            event_id = event.get('id', index)
+            infeasible = check_alt(event['companies'], event['students'], event['terms'])
+        except Exception as e:
+            respond({'id': index, 'error': f"{type(e).__name__}: {e}", 'elapsedMs': _elapsed_ms(start)})
+            continue
+        if infeasible:
+            respond({'id': event_id, 'result': {'infeasible': infeasible}, 'elapsedMs': _elapsed_ms(start)})
+            continue
+        key = _cache_key(event)
+        with lock:
+            cached = cache.get(key)
+        if cached is not None:
+            respond({'id': event_id, 'result': cached, 'elapsedMs': _elapsed_ms(start), 'cached': True})
+            continue
+        pool.apply_async(_solve, (event,), callback=finish(event_id, key))
+
+    pool.close()
+    pool.join()
+
+
+def _wall_ms(code):
+    # Best of COLD_START_RUNS fresh interpreters running code, startup included
+    best = None
+    for _ in range(COLD_START_RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True)
+        elapsed = _elapsed_ms(start)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+# What a fresh process per request pays before solving anything
+def measure_cold_start():
+    return {
+        'interpreterMs': _wall_ms('pass'),
+        'wrapImportMs': _wall_ms('import zadankai.zk_wrap'),
+        'solverStackMs': _wall_ms('import zadankai.zk_worker as w; w.preload()'),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve NDJSON zadankai requests from stdin with the solver stack kept loaded")
+    parser.add_argument('--processes', type=int, help="worker processes (default: CPU count)")
+    parser.add_argument('--cold-start', action='store_true', help="measure fresh process start-up costs and exit")
+    args = parser.parse_args()
+    if args.cold_start:
+        print(json.dumps(measure_cold_start()))
+    else:
+        serve(sys.stdin, sys.stdout, processes=args.processes)
@@ -1,12 +1,183 @@
 #!/usr/local/bin/python3
 
 import json
-from zadankai.zk_alt import ZadankaiCSP
+import time
+from zadankai.zk_auto import AUTO_POLICY, select_configuration
+from zadankai.zk_check import check_alt
+from zadankai.zk_output import columnar_from_columns, columnar_from_nested, columns_from_hint, nested_from_columns, write_npy, write_npz
 
+# ortools and the modules built on it are imported where a solve needs them, so that
+# inputs rejected by check_alt return without loading the solver stack
+
+OUTPUT_FORMATS = ('nested', 'columnar', 'npz', 'npy')
+# Stopping rules that only the weighted objective supports
+STAGED_UNSUPPORTED_STOPPING = {'objectiveThreshold', 'relativeThreshold', 'gap'}
+
+
+def _manual_configuration(json_input):
+    if 'decomposition' in json_input:
+        from zadankai import zk_decompose
+
+        return {
+            'engine': 'decomposition',
+            'cluster_size': json_input['decomposition'].get('clusterSize', zk_decompose.DEFAULT_CLUSTER_SIZE),
+        }
+    if 'rolling' in json_input:
+        return {
+            'engine': 'rolling',
+            'lookahead': json_input['rolling'].get('lookahead', 0),
+            'reopen': json_input['rolling'].get('reopen', False),
+        }
+    return {'engine': 'cp', 'objective': 'weighted'}
+
+
+def _hint_columns(json_input):
+    # A previous run's output, as returned by run or already decoded. Whatever still fits this
+    # input is kept; a hint with nothing usable in it is treated as no hint.
+    hint = json_input.get('hint')
+    if isinstance(hint, str):
+        try:
+            hint = json.loads(hint)
+        except ValueError:
+            return None
+    columns = columns_from_hint(
+        hint, json_input['companies']['groups'], json_input['terms']['count'], json_input['students']['count']
+    )
+    if all(g is None for column in columns for g in column):
+        return None
+    return columns
+
+
+def _solve_cp(json_input, configuration, output_format, hint_columns=None):
+    from ortools.constraint_solver import pywrapcp
+    from zadankai import zk_decompose
+    from zadankai.zk_alt import ZadankaiCSP
+    from zadankai.zk_monitor import make_sink
+
+    telemetry = json_input.get('telemetry')
+    sink = make_sink(telemetry) if telemetry is not None else None
+    stopping = json_input.get('stopping', {})
+    # Construction: a greedy schedule, from the hint when there is one, repaired into range; the
+    # search tries it first and improves on it with what is left of maxTimeout
+    started = time.monotonic()
+    construction = None
+    construction_share = configuration.get('construction_share')
+    if hint_columns is not None or construction_share is not None:
+        columns = hint_columns or [[None] * json_input['students']['count'] for _ in range(json_input['terms']['count'])]
+        deadline = started + json_input['maxTimeout'] * construction_share if construction_share is not None else None
+        construction = zk_decompose.complete(json_input, columns, deadline=deadline)
+    max_timeout = json_input['maxTimeout'] - (time.monotonic() - started)
+
+    options = {}
+    if 'next_var' in configuration:
+        options['next_var'] = getattr(pywrapcp.Solver, configuration['next_var'])
+    if 'next_value' in configuration:
+        options['next_value'] = getattr(pywrapcp.Solver, configuration['next_value'])
 
-def run(json_input):
     zk_csp = ZadankaiCSP(json_input['companies'], json_input['students'], json_input['terms'])
-    result = zk_csp.solve(json_input['weights'], max_timeout=json_input['maxTimeout'])
+    try:
+        if configuration['objective'] == 'staged':
+            result = zk_csp.solve_staged(
+                json_input['weights'],
+                max_timeout=max_timeout,
+                stage_split=configuration['stage_split'],
+                output_format=output_format,
+                hint=construction,
+                telemetry=sink,
+                telemetry_interval=telemetry.get('interval', 1.0) if telemetry is not None else 1.0,
+                stall_timeout=stopping.get('stallTimeout'),
+                **options,
+            )
+        else:
+            result = zk_csp.solve(
+                json_input['weights'],
+                max_timeout=max_timeout,
+                telemetry=sink,
+                telemetry_interval=telemetry.get('interval', 1.0) if telemetry is not None else 1.0,
+                stall_timeout=stopping.get('stallTimeout'),
+                objective_threshold=stopping.get('objectiveThreshold'),
+                relative_threshold=stopping.get('relativeThreshold'),
+                gap=stopping.get('gap'),
+                output_format=output_format,
+                hint=construction,
+                **options,
+            )
+    finally:
+        if sink is not None:
+            sink.close()
     if result is not None:
         zk_csp.print_solution()
-    return json.dumps(result)
+        return result, zk_csp.stop_reason, False
+    if construction_share is not None:
+        # The search found nothing: the construction is still a valid schedule
+        result = construction if output_format == 'nested' else columnar_from_nested(json_input, construction)
+        return result, zk_csp.stop_reason, True
+    return None, zk_csp.stop_reason, False
+
+
+def run(json_input, policy=AUTO_POLICY):
+    output_options = json_input.get('output', {'format': 'nested'})
+    if output_options['format'] not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_options['format']} (expected one of {', '.join(OUTPUT_FORMATS)})")
+    if output_options['format'] in ('npz', 'npy') and 'path' not in output_options:
+        raise ValueError(f"output.path is required for the {output_options['format']} format")
+    infeasible = check_alt(json_input['companies'], json_input['students'], json_input['terms'])
+    if infeasible:
+        return json.dumps({'infeasible': infeasible})
+
+    auto = json_input.get('mode') == 'auto'
+    configuration = select_configuration(json_input, policy) if auto else _manual_configuration(json_input)
+    if configuration.get('objective') == 'staged' and STAGED_UNSUPPORTED_STOPPING & set(json_input.get('stopping', {})):
+        # These rules are stated for the weighted objective, which solve_staged never minimizes
+        configuration['objective'] = 'weighted'
+        del configuration['stage_split']
+    output_format = 'nested' if output_options['format'] == 'nested' else 'columnar'
+    # Anything the caller must know about the result forces the wrapped output
+    notes = {}
+    hint_columns = _hint_columns(json_input) if json_input.get('hint') else None
+    if json_input.get('hint') and hint_columns is None:
+        notes['hintIgnored'] = True
+
+    if configuration['engine'] == 'decomposition':
+        from zadankai import zk_decompose
+
+        result, unrepaired = zk_decompose.solve(
+            json_input,
+            cluster_size=configuration['cluster_size'],
+            processes=json_input.get('decomposition', {}).get('processes'),
+            hint_columns=hint_columns,
+        )
+        if unrepaired:
+            notes['unrepairedTerms'] = unrepaired
+        stop_reason = None
+        if result is not None and output_format == 'columnar':
+            result = columnar_from_nested(json_input, result)
+    elif configuration['engine'] == 'rolling':
+        from zadankai import zk_rolling
+
+        columns, unrepaired = zk_rolling.solve(json_input, configuration['lookahead'], configuration['reopen'], hint_columns)
+        if unrepaired:
+            notes['unrepairedTerms'] = unrepaired
+        stop_reason = None
+        if output_format == 'columnar':
+            result = columnar_from_columns(json_input, columns)
+        else:
+            result = nested_from_columns(json_input, columns)
+    else:
+        result, stop_reason, constructed = _solve_cp(json_input, configuration, output_format, hint_columns)
+        if constructed:
+            notes['fallback'] = 'construction'
+
+    if result is not None and output_options['format'] in ('npz', 'npy'):
+        write = write_npz if output_options['format'] == 'npz' else write_npy
+        write(output_options['path'], result)
+        result = {'path': output_options['path']}
+
+    if not auto and 'stopping' not in json_input and not notes:
+        return json.dumps(result)
+    output = {'assignments': result, **notes}
+    if 'stopping' in json_input:
+        output['stopReason'] = stop_reason
+    if auto:
+        output['configuration'] = configuration
+    return json.dumps(output)